@@ -1,5 +1,4 @@
-from to_regex import Exp, Or, Then, ZeroOrMore, OneOrMore, ZeroOrOne
-import copy
+from to_regex import Exp, Or, Then, ZeroOrMore, OneOrMore, ZeroOrOne, EPS_E
 
 
 # simplifies Then expressions
@@ -15,7 +14,7 @@ def simplify_then(exp1, exp2):
             elif exp2 == exp1.exp:
                 return exp1
         # if the second part is an or-more
-        elif exp1.exp == exp2.exp:
+        elif exp2.exp_type in ("OneOrMore", "ZeroOrMore", "ZeroOrOne") and exp1.exp == exp2.exp:
             # case of "OneM(a) then OneM(a)"
             if exp2.exp_type == "OneOrMore":
                 return Then([exp1.exp, OneOrMore(exp1.exp)])
@@ -59,7 +58,7 @@ def simplify_then(exp1, exp2):
             if exp2.name == "e":
                 return exp1
         # if the second part is an or-more
-        elif exp1.exp == exp2.exp:
+        elif exp2.exp_type in ("OneOrMore", "ZeroOrMore", "ZeroOrOne") and exp1.exp == exp2.exp:
             # case of "ZeroOne(a) then OneM(a)"
             if exp2.exp_type == "OneOrMore":
                 return OneOrMore(exp1.exp)
@@ -210,51 +209,42 @@ def simplify_or(exp1, exp2):
 def simplify_one_more(one_more):
     if one_more.exp.exp_type == "Exp":
         if one_more.exp.name == "e":
-            return Exp("e")
+            return EPS_E
     elif one_more.exp.exp_type == "OneOrMore":
         return OneOrMore(one_more.exp.exp)
     elif one_more.exp.exp_type == "ZeroOrMore":
         return ZeroOrMore(one_more.exp.exp)
     elif one_more.exp.exp_type == "ZeroOrOne":
         return ZeroOrMore(one_more.exp.exp)
-    elif one_more.exp.exp_type == "Or":
-        return simplify_or_helper(one_more.exp)
-    elif one_more.exp.exp_type == "Then":
-        return simplify_then_helper(one_more.exp)
+    # an Or/Then inside has already been simplified by simplify_helper, keep the one-more around it
     return one_more
 
 
 def simplify_zero_more(zero_more):
     if zero_more.exp.exp_type == "Exp":
         if zero_more.exp.name == "e":
-            return Exp("e")
+            return EPS_E
     elif zero_more.exp.exp_type == "OneOrMore":
         return ZeroOrMore(zero_more.exp.exp)
     elif zero_more.exp.exp_type == "ZeroOrMore":
         return ZeroOrMore(zero_more.exp.exp)
     elif zero_more.exp.exp_type == "ZeroOrOne":
         return ZeroOrMore(zero_more.exp.exp)
-    elif zero_more.exp.exp_type == "Or":
-        return simplify_or_helper(zero_more.exp)
-    elif zero_more.exp.exp_type == "Then":
-        return simplify_then_helper(zero_more.exp)
+    # an Or/Then inside has already been simplified by simplify_helper, keep the zero-more around it
     return zero_more
 
 
 def simplify_zero_one(zero_one):
     if zero_one.exp.exp_type == "Exp":
         if zero_one.exp.name == "e":
-            return Exp("e")
+            return EPS_E
     elif zero_one.exp.exp_type == "OneOrMore":
         return ZeroOrMore(zero_one.exp.exp)
     elif zero_one.exp.exp_type == "ZeroOrMore":
         return ZeroOrMore(zero_one.exp.exp)
     elif zero_one.exp.exp_type == "ZeroOrOne":
         return ZeroOrOne(zero_one.exp.exp)
-    elif zero_one.exp.exp_type == "Or":
-        return simplify_or_helper(zero_one.exp)
-    elif zero_one.exp.exp_type == "Then":
-        return simplify_then_helper(zero_one.exp)
+    # an Or/Then inside has already been simplified by simplify_helper, keep the zero-one around it
     return zero_one
 
 
@@ -272,8 +262,7 @@ def collapse_mutli_or(or_exp):
 def simplify_or_helper(or_exp):
     # collapse nested ORs
     or_exp = collapse_mutli_or(or_exp)
-    for i in range(len(or_exp.exps)):
-        or_exp.exps[i] = simplify_helper(or_exp.exps[i])
+    or_exp = Or([simplify_helper(x) for x in or_exp.exps])
 
     changed = {}
     for i in range(len(or_exp.exps)):
@@ -304,10 +293,10 @@ def simplify_or_helper(or_exp):
             else:
                 new_parts += [or_exp.exps[x]]
 
-    ret = Exp("e")
+    ret = EPS_E
 
     if len(new_parts) == 0:
-        ret = Exp("e")
+        ret = EPS_E
     elif len(new_parts) == 1:
         ret = new_parts[0]
     else:
@@ -317,8 +306,7 @@ def simplify_or_helper(or_exp):
 
 
 def simplify_then_helper(then_exp):
-    for i in range(len(then_exp.exps)):
-        then_exp.exps[i] = simplify_helper(then_exp.exps[i])
+    then_exp = Then([simplify_helper(x) for x in then_exp.exps])
 
     changed = {}
     for i, j in zip(range(len(then_exp.exps) - 1), range(1, len(then_exp.exps))):
@@ -340,10 +328,10 @@ def simplify_then_helper(then_exp):
             new_parts += [then_exp.exps[k]]
             k += 1
 
-    ret = Exp("e")
+    ret = EPS_E
 
     if len(new_parts) == 0:
-        ret = Exp("e")
+        ret = EPS_E
     elif len(new_parts) == 1:
         ret = new_parts[0]
     else:
@@ -358,20 +346,17 @@ def simplify_helper(root):
         return root
 
     elif root.exp_type == "OneOrMore":
-        root.exp = simplify_helper(root.exp)
-        root = simplify_one_more(root)
+        root = simplify_one_more(OneOrMore(simplify_helper(root.exp)))
         # print("--- AFTER OM --- ", root)
         return root
 
     elif root.exp_type == "ZeroOrMore":
-        root.exp = simplify_helper(root.exp)
-        root = simplify_zero_more(root)
+        root = simplify_zero_more(ZeroOrMore(simplify_helper(root.exp)))
         # print("--- AFTER ZM --- ", root)
         return root
 
     elif root.exp_type == "ZeroOrOne":
-        root.exp = simplify_helper(root.exp)
-        root = simplify_zero_one(root)
+        root = simplify_zero_one(ZeroOrOne(simplify_helper(root.exp)))
         # print("--- AFTER ZO --- ", root)
         return root
 
@@ -386,12 +371,13 @@ def simplify_helper(root):
 
 
 def simplify_regex(root):
-    new_root = simplify_helper(copy.deepcopy(root))
+    # Exps are immutable, so each pass builds a new tree and root can be compared against it directly
+    new_root = simplify_helper(root)
     # count = 0
     while new_root != root:
         # print("iteration # ", count)
         root = new_root
-        new_root = simplify_helper(copy.deepcopy(root))
+        new_root = simplify_helper(root)
         # count += 1
 
     return new_root
@@ -1,4 +1,3 @@
-import copy
 import simplify
 import to_goldbar
 import argparse
@@ -7,238 +6,385 @@ import sys
 import json
 
 
+# Exps are immutable: children are never reassigned after construction, so nodes can be
+# shared between paths, the hash can be computed once up front and the string form cached
 class Exp:
+    __slots__ = ('exp_type', 'name', '_hash', '_str')
+
     def __init__(self, name):
         self.exp_type = "Exp"
         self.name = name
+        self._hash = hash((self.exp_type, name))
+        self._str = None  # filled in on first str()
+
+    # sub-expressions compared by __eq__
+    def children(self):
+        return ()
 
     def __str__(self):
-        return "Exp(" + str(self.name) + ")"
+        if self._str is None:
+            self._str = "Exp(" + str(self.name) + ")"
+        return self._str
 
     def __repr__(self):
         return str(self)
 
+    def __hash__(self):
+        return self._hash
+
     def __eq__(self, other):
-        return hash(str(self)) == hash(str(other))
+        if self is other:
+            return True
+        # compared by shape rather than class, running this file as a script makes a second copy of the classes
+        # (__main__.Exp) next to the to_regex.Exp that simplify imports
+        if not hasattr(other, "exp_type"):
+            return NotImplemented
+        return (hash(self) == hash(other) and self.exp_type == other.exp_type and self.name == other.name
+                and self.children() == other.children())
 
 
 class Or(Exp):
+    __slots__ = ('exps',)
+
     # exps is a list (can be more than 2 elements) of everything being OR-ed
     def __init__(self, exps):
         self.exp_type = "Or"
         self.name = "or"
-        self.exps = exps
+        # absorb nested Ors so chains stay flat
+        flat = []
+        for e in exps:
+            if e.exp_type == "Or":
+                flat.extend(e.exps)
+            else:
+                flat.append(e)
+        self.exps = tuple(flat)
+        self._hash = hash((self.exp_type, self.exps))
+        self._str = None
+
+    def children(self):
+        return self.exps
 
     def __str__(self):
-        return "Or(" + str(self.exps) + ")"
+        if self._str is None:
+            self._str = "Or(" + str(list(self.exps)) + ")"
+        return self._str
 
     def __repr__(self):
         return str(self)
 
 
 class Then(Exp):
+    __slots__ = ('exps',)
+
     # exps is a list (can be more than 2 elements) of everything being THEN-ed
     def __init__(self, exps):
         self.exp_type = "Then"
         self.name = "then"
-        self.exps = exps
+        # absorb nested Thens so chains stay flat
+        flat = []
+        for e in exps:
+            if e.exp_type == "Then":
+                flat.extend(e.exps)
+            else:
+                flat.append(e)
+        self.exps = tuple(flat)
+        self._hash = hash((self.exp_type, self.exps))
+        self._str = None
+
+    def children(self):
+        return self.exps
 
     def __str__(self):
-        return "Then(" + str(self.exps) + ")"
+        if self._str is None:
+            self._str = "Then(" + str(list(self.exps)) + ")"
+        return self._str
 
     def __repr__(self):
         return str(self)
 
 
 class ZeroOrMore(Exp):
+    __slots__ = ('exp',)
+
     # exp is an Exp type that is being ZM-ed
     def __init__(self, exp):
         self.exp_type = "ZeroOrMore"
         self.name = "zero-or-more"
         self.exp = exp
+        self._hash = hash((self.exp_type, exp))
+        self._str = None
+
+    def children(self):
+        return (self.exp,)
 
     def __str__(self):
-        return "ZeroOrMore(" + str(self.exp) + ")"
+        if self._str is None:
+            self._str = "ZeroOrMore(" + str(self.exp) + ")"
+        return self._str
 
     def __repr__(self):
         return str(self)
 
 
 class OneOrMore(Exp):
+    __slots__ = ('exp',)
+
     # exp is an Exp type that is being OM-ed
     def __init__(self, exp):
         self.exp_type = "OneOrMore"
         self.name = "one-or-more"
         self.exp = exp
+        self._hash = hash((self.exp_type, exp))
+        self._str = None
+
+    def children(self):
+        return (self.exp,)
 
     def __str__(self):
-        return "OneOrMore(" + str(self.exp) + ")"
+        if self._str is None:
+            self._str = "OneOrMore(" + str(self.exp) + ")"
+        return self._str
 
     def __repr__(self):
         return str(self)
 
 
 class ZeroOrOne(Exp):
+    __slots__ = ('exp',)
+
     # exp is an Exp type that is being ZO-ed
     def __init__(self, exp):
         self.exp_type = "ZeroOrOne"
         self.name = "zero-or-one"
         self.exp = exp
+        self._hash = hash((self.exp_type, exp))
+        self._str = None
+
+    def children(self):
+        return (self.exp,)
 
     def __str__(self):
-        return "ZeroOrOne(" + str(self.exp) + ")"
+        if self._str is None:
+            self._str = "ZeroOrOne(" + str(self.exp) + ")"
+        return self._str
 
     def __repr__(self):
         return str(self)
 
 
+# shared leaves
+EPS_UNDERSCORE = Exp("_")  # no edge
+EPS_E = Exp("e")  # epsilon
+
+
 class DFA:
+    __slots__ = ('states', 'init_state', 'final_states', 'transition_funct', 'regex', 'state_id', 'ds_rows', 'alive',
+                 'preds', 'succs', 'intermediate_states', '_excluded', '_pool')
+
     def __init__(self, states, init_state, final_states, transition_funct):
         self.states = states  # would be each node in the graph
         self.init_state = init_state  # start node
         self.final_states = final_states  # accept nodes (list)
-        # dictionary of the form {node1: {node1:"how to get to node1 from node1", node2: "how to get to node2 from node1", ...}, node2:{}, ...}
+        self._excluded = frozenset([init_state, *final_states])  # states that are never eliminated
+        # dictionary of the form {node1: {node1:("a", "b"), node2: (), ...}, node2:{}, ...} where each label is a tuple of
+        # the ways to get to the inner node from the outer node (an empty tuple means there is no edge)
         self.transition_funct = transition_funct
         self.regex = ''  # the resulting regex that will be returned
-        self.ds = {}  # holds the states after collapsing edges
-        self.transition_dict = {}  # same as transition_funct but with strings converted to Exps
-        self.set_transition_dict()  # fills in transition_dict with info from transition_funct
-
-    def format_nested(self, exp_type, parts):
-        if len(parts) == 0:
-            return Exp("")
-        elif len(parts) == 1:
-            return parts[0]
-        else:
-            return exp_type(parts[0], self.format_nested(exp_type, parts[1:]))
+        self.state_id = {state: idx for idx, state in enumerate(states)}  # position of each state in the state list
+        self.ds_rows = []  # ds_rows[i][j] holds the path from state id i to state id j after collapsing edges
+        self.alive = bytearray()  # alive[i] is 0 once state id i has been eliminated
+        self.preds = []  # direct parents of each state id (excluding itself)
+        self.succs = []  # direct children of each state id (excluding itself)
+        self.intermediate_states = []  # ids of everything except for start and accept nodes
+        # canonical instance of every Exp built through the mk_* methods, so structurally equal subexpressions are
+        # the same object and the regex is a DAG rather than a tree (freed along with the DFA)
+        self._pool = {EPS_UNDERSCORE: EPS_UNDERSCORE, EPS_E: EPS_E}
+        self.set_transition_dict()  # fills in ds_rows with info from transition_funct
 
     def set_transition_dict(self):
-        dict_states = {r: {c: Exp('_') for c in self.states} for r in self.states}
-        for key in self.transition_funct:
-            val = self.transition_funct[key]
-            for v_key in val:
-                if val[v_key] != "_":
-                    parts = val[v_key].split(", ")
-                    if len(parts) == 1:
-                        dict_states[key][v_key] = Exp(val[v_key])
-                    else:
-                        for i in range(len(parts)):
-                            parts[i] = Exp(parts[i])
-                        dict_states[key][v_key] = Or(parts)
-
-        self.ds = dict_states
-        self.transition_dict = copy.deepcopy(dict_states)
+        n = len(self.states)
+        ds_rows = [[EPS_UNDERSCORE] * n for r in range(n)]
+        preds = [set() for r in range(n)]
+        succs = [set() for r in range(n)]
+        for key, val in self.transition_funct.items():
+            i = self.state_id[key]
+            for v_key, parts in val.items():
+                j = self.state_id[v_key]
+                if len(parts) == 1:
+                    ds_rows[i][j] = self.mk_leaf(parts[0])
+                elif len(parts) > 1:
+                    ds_rows[i][j] = self.mk_or([self.mk_leaf(p) for p in parts])
+                else:
+                    continue
+                if i != j:
+                    succs[i].add(j)
+                    preds[j].add(i)
+
+        self.preds = preds
+        self.succs = succs
+        self.alive = bytearray(b'\x01') * n
+        self.ds_rows = ds_rows
+        self.intermediate_states = [idx for idx, state in enumerate(self.states) if state not in self._excluded]
+
+    def intern_exp(self, exp):
+        return self._pool.setdefault(exp, exp)
+
+    # an empty label is an epsilon, so it becomes EPS_E like 'e'
+    def mk_leaf(self, name):
+        if name == "":
+            return EPS_E
+        return self.intern_exp(Exp(name))
+
+    def mk_or(self, exps):
+        return self.intern_exp(Or(exps))
+
+    def mk_then(self, exps):
+        return self.intern_exp(Then(exps))
+
+    def mk_zm(self, exp):
+        return self.intern_exp(ZeroOrMore(exp))
+
+    def mk_om(self, exp):
+        return self.intern_exp(OneOrMore(exp))
+
+    # the methods below work on state ids (positions in self.states) rather than names
 
     def get_intermediate_states(self):
-        return [state for state in self.states if state not in ([self.init_state] + self.final_states)]
+        return self.intermediate_states
 
+    # sorted so the output is deterministic
     def get_predecessors(self, state):
-        return [key for key, value in self.ds.items() if
-                state in value.keys() and value[state].name != '_' and key != state]
+        return sorted(self.preds[state])
 
     def get_successors(self, state):
-        return [key for key, value in self.ds[state].items() if value.name != '_' and key != state]
+        return sorted(self.succs[state])
 
+    # empty entries are always EPS_UNDERSCORE, so this is the loop or EPS_UNDERSCORE if there isn't one
     def get_if_loop(self, state):
-        if self.ds[state][state].name != '_':
-            return self.ds[state][state]
-        else:
-            return Exp("_")
+        return self.ds_rows[state][state]
 
-    # creates a ZeroOrMore object
+    # creates a ZeroOrMore object (get_if_loop returns EPS_UNDERSCORE when there is no loop)
     def format_zero_or_more(self, loop):
-        if loop.name != "_" and len(loop.name) > 0:
-            return ZeroOrMore(loop)
+        if loop is not EPS_UNDERSCORE:
+            return self.mk_zm(loop)
         else:
             return loop
 
     # creates a OneOrMore object
     def format_one_or_more(self, loop):
-        if loop.name != "_" and len(loop.name) > 0:
-            return OneOrMore(loop)
+        if loop is not EPS_UNDERSCORE:
+            return self.mk_om(loop)
         else:
             return loop
 
     # checks if a pair of expressions can form a one-or-more
     def check_one_more(self, pred_to_inter, inter_loop):
-        if pred_to_inter.name == inter_loop.name:
+        if pred_to_inter == inter_loop:
             return True
         else:
             return False
 
     # formats path to remove epsilons
     def format_new_path(self, path_parts):
-        non_blanks = []
-        for x in path_parts:
-            # if a part is an epsilon or non-entry
-            if len(x.name) != 0 and x.name != "e" and x.name != "_":
-                non_blanks += [x]
+        # drop parts that are an epsilon or non-entry (leaves are interned, so these are identity checks)
+        non_blanks = [x for x in path_parts if x is not EPS_UNDERSCORE and x is not EPS_E]
 
         # if no parts, return epsilon
         if len(non_blanks) == 0:
-            return Exp("e")
+            return EPS_E
         # if one part, return that part
         elif len(non_blanks) == 1:
             return non_blanks[0]
-        # if multiple, return THEN of all parts
+        # if multiple, return THEN of all parts (Then absorbs the parts of nested Thens itself)
         else:
-            then_list = []
-            for part in non_blanks:
-                if part.exp_type == "Then":
-                    then_list += part.exps
-                else:
-                    then_list += [part]
-
-            new_path = Then(then_list)
-            return new_path
+            return self.mk_then(non_blanks)
 
     # formats the expression that goes into the state dictionary
     # combine correctly with existing path at (i, j)
     def format_entry(self, entry, i, j, exp):
-        if entry.name == "_" or len(entry.name) == 0:
+        if entry is EPS_UNDERSCORE:
+            # new edge between i and j
+            if i != j:
+                self.succs[i].add(j)
+                self.preds[j].add(i)
             return exp
         else:
             if i == j:
-                return Or([ZeroOrMore(entry), exp])
+                return self.format_or([self.mk_zm(entry), exp])
+            else:
+                return self.format_or([entry, exp])
+
+    # creates an Or object without duplicate members
+    def format_or(self, parts):
+        # flatten and dedupe here (a dict keeps first-seen order) so only the final Or gets built
+        members = {}
+        for part in parts:
+            if part.exp_type == "Or":
+                members.update(dict.fromkeys(part.exps))
             else:
-                return Or([entry, exp])
+                members[part] = None
+        exps = tuple(members)
+        if len(exps) == 1:
+            return exps[0]
+        else:
+            return self.mk_or(exps)
+
+    # cost of eliminating a state: number of new paths it creates, plus one if it has a loop
+    def elimination_weight(self, state):
+        has_loop = 0 if self.ds_rows[state][state] is EPS_UNDERSCORE else 1
+        return len(self.preds[state]) * len(self.succs[state]) + has_loop
 
     def toregex(self):
         intermediate_states = self.get_intermediate_states()  # returns everything except for start and accept nodes
-        dict_states = self.ds
+        ds_rows = self.ds_rows
+        alive = self.alive
+        # bound once, these are called for every parent/child pair
+        format_new_path = self.format_new_path
+        format_entry = self.format_entry
+
+        for _ in range(len(intermediate_states)):
+            # eliminate the state that creates the fewest new paths first
+            inter = min((state for state in intermediate_states if alive[state]), key=self.elimination_weight)
 
-        for inter in intermediate_states:
             predecessors = self.get_predecessors(inter)  # direct parents of this node
             successors = self.get_successors(inter)  # direct children of this node
 
+            # loop on the current node, the same for every parent/child pair
+            inter_loop = self.get_if_loop(inter)
+            inter_loop_zm = self.format_zero_or_more(inter_loop)
+            inter_loop_om = self.format_one_or_more(inter_loop)
+            row_inter = ds_rows[inter]
+
             for i in predecessors:
+                row_i = ds_rows[i]
+                # if there is a loop found from the current parent to itself, this becomes a ZM
+                pred_loop = self.format_zero_or_more(self.get_if_loop(i))
+                # get the path from the parent to the current node
+                pred_to_inter = row_i[inter]
+                # based on ZM of parent and loop in current, check for OM
+                if self.check_one_more(pred_to_inter, inter_loop):
+                    path_start = [pred_loop, inter_loop_om]
+                else:
+                    path_start = [pred_loop, pred_to_inter, inter_loop_zm]
+
                 for j in successors:
-                    # returns if there is currently any path found from this node back to itself
-                    inter_loop = self.get_if_loop(inter)
-                    # if there is a loop found from the current parent to itself, this becomes a ZM
-                    pred_loop = self.format_zero_or_more(self.get_if_loop(i))
-
-                    # get the paths from the parent to the current and the current to the child node
-                    pred_to_inter = dict_states[i][inter]
-                    inter_to_succ = dict_states[inter][j]
-
-                    # based on ZM of parent and loop in current, check for OM
-                    if self.check_one_more(pred_to_inter, inter_loop):
-                        inter_loop = self.format_one_or_more(inter_loop)
-                        new_path = self.format_new_path([pred_loop, inter_loop, inter_to_succ])
-                    else:
-                        inter_loop = self.format_zero_or_more(inter_loop)
-                        pred_to_inter = pred_to_inter
-                        new_path = self.format_new_path([pred_loop, pred_to_inter, inter_loop, inter_to_succ])
+                    # add the path from the current to the child node
+                    new_path = format_new_path(path_start + [row_inter[j]])
 
                     # enter new path from parent to child that doesn't include the current "inter" node
-                    dict_states[i][j] = self.format_entry(dict_states[i][j], i, j, new_path)
-            # remove inter node
-            dict_states = {r: {c: v for c, v in val.items() if c != inter} for r, val in dict_states.items() if
-                           r != inter}
-            self.ds = copy.deepcopy(dict_states)
+                    row_i[j] = format_entry(row_i[j], i, j, new_path)
+            # remove inter node (in place, Exps are shared by reference and never mutated)
+            alive[inter] = 0
+            for i in predecessors:
+                ds_rows[i][inter] = EPS_UNDERSCORE
+                self.succs[i].discard(inter)
+            for j in successors:
+                ds_rows[inter][j] = EPS_UNDERSCORE
+                self.preds[j].discard(inter)
+            self.preds[inter].clear()
+            self.succs[inter].clear()
 
-        return dict_states[self.init_state][self.final_states[0]]
+        return ds_rows[self.state_id[self.init_state]][self.state_id[self.final_states[0]]]
 
 
 def main():
@@ -261,46 +407,34 @@ def main():
     #     final_states = args['accepts']
     #     transition_funct = args['transition']
 
-    # create a start node with an empty edge to the actual first edge ('e' is the epsilon)
-    start_array = {}
-    for key in transition_funct:
-        val = transition_funct[key]
-        if key == init_state:
-            start_array[key] = 'e'
-        else:
-            start_array[key] = '_'
-        val['START'] = '_'
-        transition_funct[key] = val
+    # create a start node with an empty edge to the actual first edge and a final node with an empty edge pointing to
+    # it from each actual final node ('e' is the epsilon), filling in the new columns of every row in the same pass
+    final_states_set = set(final_states)
+    start_array = {key: ('e' if key == init_state else '_') for key in transition_funct}
     start_array['FINAL'] = '_'
-    transition_funct['START'] = start_array
-
-    # create a final node with an empty edge pointing to it from the actual final node ('e' is the epsilon)
-    final_array = {}
-    for key in transition_funct:
-        val = transition_funct[key]
-        if key in final_states:
-            val['FINAL'] = 'e'
-        else:
-            val['FINAL'] = '_'
-        final_array[key] = '_'
-        transition_funct[key] = val
+    final_array = {key: '_' for key in transition_funct}
     final_array['FINAL'] = '_'
+    for key, val in transition_funct.items():
+        val['START'] = '_'
+        val['FINAL'] = 'e' if key in final_states_set else '_'
+    transition_funct['START'] = start_array
     transition_funct['FINAL'] = final_array
 
+    # split each label into its alternatives once ('_' means no edge and becomes an empty tuple)
+    for val in transition_funct.values():
+        for key, label in val.items():
+            val[key] = () if label == '_' else tuple(label.split(", "))
+
     # redefine the initial and final states and the state list
     init_state = 'START'
     final_states = ['FINAL']
     states += ['START', 'FINAL']
 
-    r = Exp("")
-    simp = Exp("")
-    goldbar = ""
-
-    for f in final_states:
-        dfa = DFA(states, init_state, [f], transition_funct)
-        r = dfa.toregex()
-        simp = simplify.simplify_regex(r)
-        goldbar = to_goldbar.to_goldbar(simp)
+    # every actual final node has an epsilon edge to FINAL, so one elimination covers all of them
+    dfa = DFA(states, init_state, final_states, transition_funct)
+    r = dfa.toregex()
+    simp = simplify.simplify_regex(r)
+    goldbar = to_goldbar.to_goldbar(simp)
 
     print(goldbar)
 